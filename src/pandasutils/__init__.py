@@ -1,6 +1,6 @@
 __version__ = '0.6.1.0'
 
-from pandasutils.cli import main, format_columns_name, print_value_counts, get_field_from_df, join_dataframe_from_folder, split_unique, reduce_dataframe_size, _mem_usage
+from pandasutils.cli import main, format_columns_name, print_value_counts, get_field_from_df, join_dataframe_from_folder, split_unique, reduce_dataframe_size, _mem_usage, multiprocessing_apply, register_shared, unregister_shared, get_shared, profile_dataframe, HyperLogLog, Pipeline
 
 # Major
 # Minor
@@ -4,3 +4,258 @@ from pandasutils.cli import main
 
 def test_main():
     assert main([]) == 0
+
+
+def test_reduce_dataframe_size_threads():
+    import numpy as np
+    import pandas as pd
+    from pandasutils import reduce_dataframe_size
+
+    df_data = pd.DataFrame({'a': np.arange(100), 'b': np.random.rand(100), 'c': pd.Series(['x', 'y'] * 50, dtype=object)})
+    df_serial = reduce_dataframe_size(df_data, num_threads=1, verbose=False)
+    df_threads = reduce_dataframe_size(df_data, num_threads=4, verbose=False)
+
+    assert list(df_threads.columns) == list(df_data.columns)
+    assert df_threads['a'].dtype == np.uint8
+    assert df_threads['c'].dtype.name == 'category'
+    pd.testing.assert_frame_equal(df_serial, df_threads)
+
+
+def _lookup_name(row):
+    from pandasutils import get_field_from_df
+
+    return get_field_from_df(row['id'], 'id', 'name', 'reference', null_return='missing')
+
+
+def test_multiprocessing_apply_shared():
+    import pandas as pd
+    from pandasutils import multiprocessing_apply
+
+    df_reference = pd.DataFrame({'id': [1, 2, 3], 'name': ['a', 'b', 'c']})
+    df_data = pd.DataFrame({'id': [3, 1, 4, 2]})
+
+    res = multiprocessing_apply(df_data, _lookup_name, axis=1, num_cores=2,
+                                shared={'reference': df_reference}, shared_index={'reference': ['id']})
+
+    assert list(res) == ['c', 'a', 'missing', 'b']
+
+
+def test_join_dataframe_from_folder_pushdown(tmpdir):
+    from pandasutils import join_dataframe_from_folder
+
+    tmpdir.join('a.csv').write('Id;Name;Extra\n1;a;x\n2;b;y\n3;c;z\n')
+    tmpdir.mkdir('sub').join('b.csv').write('ID,Name ,Other\n4,d,q\n5,e,r\n')
+
+    df_data = join_dataframe_from_folder(str(tmpdir), columns=['id', 'Name'], filter=lambda x: x['id'] % 2 == 1,
+                                         chunksize=1)
+
+    assert list(df_data.columns) == ['id', 'name', 'file']
+    assert sorted(df_data['id']) == [1, 3, 5]
+
+
+def test_join_dataframe_from_folder_schema(tmpdir):
+    from pandasutils import join_dataframe_from_folder
+
+    tmpdir.join('a.csv').write('a,b,c,d\n1,x,1.5,7\n2,y,2.5,8\n')
+    tmpdir.join('b.csv').write('a,b\n3,z\n')
+
+    df_data, df_report = join_dataframe_from_folder(str(tmpdir), set_file=False, return_report=True)
+
+    assert df_data['a'].dtype == 'int64'
+    assert df_data['c'].dtype == 'float64'
+    assert df_data['d'].dtype == 'Int64'
+    assert list(df_data['d'].isna()) == [False, False, True]
+    assert df_data.shape == (3, 4)
+    assert sorted(df_report['column']) == ['c', 'd', 'd']
+
+
+def test_concat_with_schema():
+    import numpy as np
+    import pandas as pd
+    from pandasutils.cli import _concat_with_schema
+
+    df_data, _ = _concat_with_schema([('a', pd.DataFrame({'c': pd.Categorical(['u', 'v'])})),
+                                      ('b', pd.DataFrame({'c': pd.Categorical(['w', 'u'])}))])
+    assert list(df_data['c'].cat.categories) == ['u', 'v', 'w']
+    assert list(df_data['c']) == ['u', 'v', 'w', 'u']
+
+    df_uint = pd.DataFrame({'x': np.array([1, 2], dtype=np.uint64)})
+    df_int = pd.DataFrame({'x': np.array([-1], dtype=np.int64)})
+    df_other = pd.DataFrame({'y': [1.0]})
+
+    df_data, _ = _concat_with_schema([('a', df_uint), ('b', df_int)])
+    assert df_data['x'].dtype == 'int64'
+
+    df_data, _ = _concat_with_schema([('a', df_uint), ('b', df_int), ('c', df_other)])
+    assert df_data['x'].dtype == 'Int64'
+
+    df_large = pd.DataFrame({'x': np.array([2 ** 63 + 1], dtype=np.uint64)})
+    df_data, _ = _concat_with_schema([('a', df_large), ('b', df_int), ('c', df_other)])
+    assert df_data['x'].dtype == object
+    assert df_data['x'].iloc[0] == 2 ** 63 + 1
+
+
+def test_infer_dataframe_filetype_excel_sheets(tmpdir):
+    import pandas as pd
+    import pytest
+    from pandasutils.cli import _infer_dataframe_filetype
+
+    pytest.importorskip('openpyxl')
+    path = str(tmpdir.join('data.xlsx'))
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'Id': [1, 2], 'Name': ['a', 'b'], 'Extra': [0, 0]}).to_excel(writer, sheet_name='one', index=False)
+        pd.DataFrame({'Id': [3], 'Name': ['c']}).to_excel(writer, sheet_name='two', index=False)
+
+    df_data = _infer_dataframe_filetype(path, sheets=None, columns=['id', 'name'], format_columns=True, num_cores=1)
+
+    assert list(df_data.columns) == ['id', 'name', 'sheet']
+    assert list(df_data['sheet']) == ['one', 'one', 'two']
+
+
+def _row_sum(row):
+    return row['a'] + row['b']
+
+
+def _row_pair(row):
+    return row['a'], row['a'] * row['b']
+
+
+def test_multiprocessing_apply_result_buffer():
+    import numpy as np
+    import pandas as pd
+    from pandasutils import multiprocessing_apply
+
+    df_data = pd.DataFrame({'a': np.arange(11), 'b': np.arange(11) * 2}, index=np.arange(11) + 100)
+
+    res = multiprocessing_apply(df_data, _row_sum, axis=1, num_cores=3, result_dtype='int32')
+    assert res.dtype == np.int32
+    assert list(res.index) == list(df_data.index)
+    assert list(res) == list(df_data['a'] * 3)
+
+    res = multiprocessing_apply(df_data, _row_pair, axis=1, num_cores=3, result_dtype='float64',
+                                result_columns=['x', 'y'])
+    assert list(res.columns) == ['x', 'y']
+    assert list(res['y']) == list(df_data['a'] * df_data['b'])
+
+
+def test_multiprocessing_apply_stats():
+    import numpy as np
+    import pandas as pd
+    from pandasutils import multiprocessing_apply
+
+    df_data = pd.DataFrame({'a': np.arange(10), 'b': np.arange(10)})
+
+    res, stats = multiprocessing_apply(df_data, _row_sum, axis=1, num_cores=2, return_stats=True)
+
+    assert list(res) == list(df_data['a'] * 2)
+    assert sum(worker['rows'] for worker in stats['workers']) == 10
+    assert stats['bytes_sent'] > 0 and stats['bytes_received'] > 0
+    assert stats['recommended_cores'] >= 1
+    assert len(stats['workers']) == 2
+    assert all(worker['init_time'] is not None for worker in stats['workers'])
+    assert 0 <= stats['map_unaccounted'] <= stats['phases']['map']
+    assert set(stats['phases']) == {'pool_startup', 'split', 'serialize_inputs', 'map', 'deserialize_results', 'concat'}
+
+
+def test_profile_dataframe(capsys):
+    import numpy as np
+    import pandas as pd
+    from pandasutils import print_value_counts, profile_dataframe, reduce_dataframe_size
+
+    df_data = pd.DataFrame({'a': [1.0, 2.0, 2.0, None], 'b': pd.Series(['x', 'y', 'x', 'x'], dtype=object)})
+    profile = profile_dataframe(df_data, top_k=1)
+
+    assert profile.loc['a', 'null_count'] == 1
+    assert profile.loc['a', 'distinct_count'] == 2
+    assert (profile.loc['a', 'min'], profile.loc['a', 'max']) == (1.0, 2.0)
+    assert profile.loc['b', 'top'] == [('x', 3)]
+    assert profile.loc['b', 'memory'] == df_data['b'].memory_usage(index=False, deep=True)
+
+    df_mixed = pd.DataFrame({'c': pd.Series(['a', None, np.nan, 1, 1.0, True], dtype=object)})
+    assert profile_dataframe(df_mixed).loc['c', 'memory'] == df_mixed['c'].memory_usage(index=False, deep=True)
+
+    print_value_counts(df_data, 'b', limit=1, profile=profile)
+    assert capsys.readouterr().out == 'x : 3 (75.00%)\n'
+
+    df_reduced = reduce_dataframe_size(df_data, categorical_columns=['b'], category_unique_percentage=0.6,
+                                       profile=profile, verbose=False)
+    assert df_reduced['b'].dtype.name == 'category'
+
+
+def test_hyperloglog():
+    import numpy as np
+    import pandas as pd
+    from pandasutils import HyperLogLog, reduce_dataframe_size
+
+    values = pd.Series(np.arange(20000) % 5000)
+    sketch = HyperLogLog(14).update(values[:10000]).merge(HyperLogLog(14).update(values[10000:]))
+
+    assert abs(sketch.count() - 5000) < 5000 * 4 * sketch.error()
+    assert (sketch.rows, sketch.nulls) == (20000, 0)
+
+    df_data = pd.DataFrame({'a': values.astype(str).astype(object)})
+    df_reduced = reduce_dataframe_size(df_data, categorical_columns=['a'], distinct_precision=12, verbose=False)
+    assert df_reduced['a'].dtype.name == 'category'
+
+
+def test_pipeline(tmpdir):
+    from pandasutils import Pipeline
+
+    tmpdir.join('a.csv').write('Id,State,Value\n1,sp,1.5\n2,rj,2.5\n3,sp,1\n')
+    tmpdir.mkdir('sub').join('b.csv').write('ID,State \n4,sp\n5,mg\n')
+
+    pipeline = Pipeline(str(tmpdir)).format_columns_name().reduce_dataframe_size().split_unique('state')
+
+    assert 'format_columns_name per chunk' in pipeline.explain()
+
+    df_split = pipeline.execute(num_cores=2)
+
+    assert sorted(df_split) == ['mg', 'rj', 'sp']
+    assert sorted(df_split['sp']['id']) == [1, 3, 4]
+    assert list(df_split['mg'].columns) == ['id', 'state', 'value', 'file']
+
+
+def test_pipeline_category_decision(tmpdir, monkeypatch):
+    import pandas as pd
+    from pandasutils import Pipeline, format_columns_name, join_dataframe_from_folder, reduce_dataframe_size
+
+    tmpdir.join('big.csv').write('state,value\n' + ''.join('{},{}\n'.format(['sp', 'rj'][i % 2], i) for i in range(1000)))
+    tmpdir.join('small.csv').write('state,value\nmg,1\n')
+
+    df_pipeline = Pipeline(str(tmpdir)).format_columns_name().reduce_dataframe_size(
+        categorical_columns=['state', 'file']).execute(num_cores=2)
+    df_sequential = reduce_dataframe_size(format_columns_name(join_dataframe_from_folder(str(tmpdir))),
+                                          categorical_columns=['state', 'file'], verbose=False)
+
+    assert df_pipeline['state'].dtype == df_sequential['state'].dtype
+    assert df_pipeline['file'].dtype == df_sequential['file'].dtype
+    assert list(df_pipeline['state'].cat.categories) == ['mg', 'rj', 'sp']
+
+    # inferred candidates: state is only object on the unified schema (all nulls, read as float, on small.csv)
+    tmpdir.join('small.csv').write('state,value\n,1\n')
+
+    if hasattr(pd.options, 'future') and hasattr(pd.options.future, 'infer_string'):
+        monkeypatch.setattr(pd.options.future, 'infer_string', False)
+
+    df_pipeline = Pipeline(str(tmpdir)).format_columns_name().reduce_dataframe_size().execute(num_cores=2)
+    df_sequential = reduce_dataframe_size(format_columns_name(join_dataframe_from_folder(str(tmpdir))), verbose=False)
+
+    assert list(df_pipeline.dtypes) == list(df_sequential.dtypes)
+    assert isinstance(df_pipeline['state'].dtype, pd.CategoricalDtype)
+    assert list(df_pipeline['state'].cat.categories) == ['rj', 'sp']
+    assert df_pipeline['state'].isnull().sum() == 1
+
+
+def test_shared_index_bad_field():
+    import pandas as pd
+    import pytest
+    from pandasutils import multiprocessing_apply, register_shared
+
+    df_reference = pd.DataFrame({'id': [1, 2, 3], 'name': ['a', 'b', 'c']})
+
+    with pytest.raises(KeyError):
+        register_shared('reference', df_reference, index_fields=['ID'])
+
+    with pytest.raises(KeyError):
+        multiprocessing_apply(pd.DataFrame({'id': [1, 2]}), _lookup_name, axis=1, num_cores=2,
+                              shared={'reference': df_reference}, shared_index={'reference': ['ID']})